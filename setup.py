@@ -19,7 +19,8 @@ with open(os.path.join('testcywebserviceapp', '__init__.py')) as ver_file:
             version=re.sub("'", "", line[line.index("'"):])
 
 requirements = [
-    'ndex2'
+    'ndex2',
+    'ijson'
 ]
 
 test_requirements = [
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import argparse
+import json
+import random
+import shlex
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import testcywebserviceapp
+from testcywebserviceapp.testcywebserviceappcmd import MODES, maxrss_to_bytes
+
+MESSAGE_PREFIX = '@@MESSAGE'
+PROGRESS_PREFIX = '@@PROGRESS'
+
+APP_MODULE = 'testcywebserviceapp.testcywebserviceappcmd'
+
+
+def _parse_arguments(desc, args):
+    """
+    Parses command line arguments
+    :param desc:
+    :param args:
+    :return:
+    """
+    help_fm = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(description=desc,
+                                     formatter_class=help_fm)
+    parser.add_argument('--num_jobs', type=int, default=50,
+                        help='Total number of jobs to run')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Number of jobs to run at once')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES,
+                        help='Modes to cycle through, one per job')
+    parser.add_argument('--num_nodes', type=int, default=1000,
+                        help='Number of nodes in each synthetic network')
+    parser.add_argument('--num_edges', type=int, default=2000,
+                        help='Number of edges in each synthetic network')
+    parser.add_argument('--num_networks', type=int, default=4,
+                        help='Number of distinct synthetic networks to '
+                             'spread jobs across')
+    parser.add_argument('--app_args', default='',
+                        help='Extra arguments passed to every job, '
+                             'for example "--max_memory 512"')
+    parser.add_argument('--random_seed', default=time.time(), type=float,
+                        help='Seed for random number generator')
+    return parser.parse_args(args)
+
+
+def generate_synthetic_cx2(num_nodes, num_edges, rand=random):
+    """
+    Generates a random network in CX2 format with metaData
+    so it looks like networks sent by the service host
+
+    :param num_nodes: number of nodes
+    :type num_nodes: int
+    :param num_edges: number of edges, ignored if there are no nodes
+    :type num_edges: int
+    :param rand: random number generator
+    :return: network in CX2 format
+    :rtype: list
+    """
+    if num_nodes <= 0:
+        num_edges = 0
+    nodes = [{'id': node_id, 'v': {'name': 'node' + str(node_id),
+                                   'group': 'group' + str(node_id % 5)},
+              'x': round(rand.uniform(-1000.0, 1000.0), 4),
+              'y': round(rand.uniform(-1000.0, 1000.0), 4)}
+             for node_id in range(num_nodes)]
+    edges = [{'id': edge_id, 's': rand.randrange(num_nodes),
+              't': rand.randrange(num_nodes), 'v': {'interaction': 'pp'}}
+             for edge_id in range(num_edges)]
+    return [{'CXVersion': '2.0', 'hasFragments': False},
+            {'metaData': [{'name': 'attributeDeclarations', 'elementCount': 1},
+                          {'name': 'networkAttributes', 'elementCount': 1},
+                          {'name': 'nodes', 'elementCount': len(nodes)},
+                          {'name': 'edges', 'elementCount': len(edges)}]},
+            {'attributeDeclarations': [{'networkAttributes': {'name': {'d': 'string'}},
+                                        'nodes': {'name': {'d': 'string'},
+                                                  'group': {'d': 'string'}},
+                                        'edges': {'interaction': {'d': 'string'}}}]},
+            {'networkAttributes': [{'name': 'synthetic ' + str(num_nodes) +
+                                            ' nodes ' + str(num_edges) + ' edges'}]},
+            {'nodes': nodes},
+            {'edges': edges},
+            {'status': [{'error': '', 'success': True}]}]
+
+
+def parse_status_line(line):
+    """
+    Parses a line written to standard error by the app the
+    way the service host does
+
+    :param line: line of standard error
+    :type line: str
+    :return: ``('message', text)``, ``('progress', percent)`` or
+             ``None`` if line is not a status line
+    :rtype: tuple
+    """
+    if line.startswith(MESSAGE_PREFIX):
+        return 'message', line[len(MESSAGE_PREFIX):].strip()
+    if line.startswith(PROGRESS_PREFIX):
+        try:
+            return 'progress', int(line[len(PROGRESS_PREFIX):].strip())
+        except ValueError:
+            return None
+    return None
+
+
+def get_exit_code(status):
+    """
+    Converts wait status from :py:func:`os.wait4` to an exit code
+    the way :py:class:`subprocess.Popen` reports it
+
+    :param status: wait status
+    :type status: int
+    :return: exit code, or negative signal number if process was
+             killed by a signal
+    :rtype: int
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_job(cmd, env=None):
+    """
+    Runs **cmd** as a subprocess, reading status lines from standard
+    error as they arrive and the result from standard out
+
+    :param cmd: command to run
+    :type cmd: list
+    :param env: environment for subprocess
+    :type env: dict
+    :return: job stats with keys ``returncode``, ``latency``,
+             ``first_progress`` (seconds or ``None``), ``peak_rss``
+             (bytes), ``messages``, ``progress`` and ``valid_result``
+    :rtype: dict
+    """
+    stats = {'messages': [], 'progress': [], 'first_progress': None}
+    start_time = time.monotonic()
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         env=env)
+
+    def read_stderr():
+        for raw_line in p.stderr:
+            status = parse_status_line(raw_line.decode('utf-8', errors='replace'))
+            if status is None:
+                continue
+            if status[0] == 'progress':
+                if stats['first_progress'] is None:
+                    stats['first_progress'] = time.monotonic() - start_time
+                stats['progress'].append(status[1])
+            else:
+                stats['messages'].append(status[1])
+
+    stderr_thread = threading.Thread(target=read_stderr, daemon=True)
+    stderr_thread.start()
+    out = p.stdout.read()
+    stderr_thread.join()
+    p.stdout.close()
+    p.stderr.close()
+
+    # wait4 instead of wait to get peak memory of this one job
+    _, status, rusage = os.wait4(p.pid, 0)
+    p.returncode = get_exit_code(status)
+    stats['latency'] = time.monotonic() - start_time
+    stats['returncode'] = p.returncode
+    stats['peak_rss'] = maxrss_to_bytes(rusage.ru_maxrss)
+    try:
+        stats['valid_result'] = isinstance(json.loads(out), list)
+    except ValueError:
+        stats['valid_result'] = False
+    return stats
+
+
+def get_percentile(values, percentile):
+    """
+    Gets **percentile** of **values** using the nearest rank method
+
+    :param values: values
+    :type values: list
+    :param percentile: percentile between 0 and 100
+    :type percentile: float
+    :return: value at percentile or ``None`` if **values** is empty
+    """
+    if not values:
+        return None
+    sorted_values = sorted(values)
+    rank = max(int(-(-percentile * len(sorted_values) // 100)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(job_stats, wall_time):
+    """
+    Summarizes stats of jobs run over **wall_time** seconds
+
+    :param job_stats: stats as returned by :py:func:`run_job`
+                      with ``mode`` added
+    :type job_stats: list
+    :param wall_time: seconds taken to run all jobs
+    :type wall_time: float
+    :return: report
+    :rtype: dict
+    """
+    def summarize_jobs(stats_list):
+        succeeded = [s for s in stats_list if s['returncode'] == 0 and s['valid_result']]
+        latencies = [s['latency'] for s in stats_list]
+        first_progress = [s['first_progress'] for s in stats_list
+                          if s['first_progress'] is not None]
+        peak_rss = [s['peak_rss'] for s in stats_list]
+        return {'jobs': len(stats_list),
+                'failed': len(stats_list) - len(succeeded),
+                'latency_p50': get_percentile(latencies, 50),
+                'latency_p95': get_percentile(latencies, 95),
+                'latency_p99': get_percentile(latencies, 99),
+                'first_progress_p50': get_percentile(first_progress, 50),
+                'first_progress_p95': get_percentile(first_progress, 95),
+                'peak_rss_max_mb': round(max(peak_rss) / 1048576.0, 1) if peak_rss else None}
+
+    report = summarize_jobs(job_stats)
+    report['wall_time'] = wall_time
+    report['throughput_jobs_per_sec'] = len(job_stats) / wall_time if wall_time > 0 else None
+    modes = {}
+    for stats in job_stats:
+        modes.setdefault(stats['mode'], []).append(stats)
+    report['modes'] = {mode: summarize_jobs(stats_list) for mode, stats_list in modes.items()}
+    return report
+
+
+def run_load_test(theargs, tmpdir):
+    """
+    Writes synthetic networks to **tmpdir** then runs
+    ``theargs.num_jobs`` jobs with at most ``theargs.concurrency``
+    running at once
+
+    :return: report as returned by :py:func:`summarize`
+    :rtype: dict
+    """
+    rand = random.Random(theargs.random_seed)
+    network_paths = []
+    for index in range(max(theargs.num_networks, 1)):
+        network_path = os.path.join(tmpdir, 'network' + str(index) + '.cx2')
+        with open(network_path, 'w') as f:
+            json.dump(generate_synthetic_cx2(theargs.num_nodes, theargs.num_edges,
+                                             rand=rand), f)
+        network_paths.append(network_path)
+
+    # make sure jobs import this copy of the package
+    env = os.environ.copy()
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(testcywebserviceapp.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([package_parent] +
+                                        ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    app_args = shlex.split(theargs.app_args)
+    completed = [0]
+    completed_lock = threading.Lock()
+
+    def run_indexed_job(index):
+        mode = theargs.modes[index % len(theargs.modes)]
+        cmd = [sys.executable, '-m', APP_MODULE,
+               network_paths[index % len(network_paths)],
+               '--mode', mode, '--random_seed', str(index)] + app_args
+        stats = run_job(cmd, env=env)
+        stats['mode'] = mode
+        with completed_lock:
+            completed[0] += 1
+            sys.stderr.write('@@PROGRESS ' + str(int(100.0 * completed[0] / theargs.num_jobs)) + '\n')
+        return stats
+
+    sys.stderr.write('@@MESSAGE Running ' + str(theargs.num_jobs) + ' jobs, ' +
+                     str(theargs.concurrency) + ' at a time\n')
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(theargs.concurrency, 1)) as executor:
+        job_stats = list(executor.map(run_indexed_job, range(theargs.num_jobs)))
+    return summarize(job_stats, time.monotonic() - start_time)
+
+
+def main(args):
+    """
+    Main entry point for load test that stands in for the
+    service host running many jobs of the app at once
+
+    :param args: command line arguments usually :py:const:`sys.argv`
+    :return: 0 for success otherwise failure
+    :rtype: int
+    """
+    desc = """
+    Runs concurrent jobs of testcywebserviceappcmd.py on synthetic
+    networks, parsing @@MESSAGE and @@PROGRESS lines as the service
+    host does, and writes a JSON report of throughput, latency,
+    time to first progress and peak memory to standard out
+    """
+    theargs = _parse_arguments(desc, args[1:])
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            report = run_load_test(theargs, tmpdir)
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.flush()
+        return 0 if report['failed'] == 0 else 1
+    except Exception as e:
+        sys.stderr.write('Caught exception: ' + str(e))
+        sys.stderr.flush()
+        return 2
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main(sys.argv))
@@ -1,19 +1,73 @@
 #!/usr/bin/env python
 
 import os
+import io
 import sys
 import time
 import argparse
 import json
 import random
 import math
+import resource
+import signal
+import threading
+import types
+import tempfile
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import ijson
 from ndex2.cx2 import RawCX2NetworkFactory, CX2Network
+from ndex2.exceptions import NDExInvalidCX2Error
 
 SOURCES_KEY = 'sources'
 RESULTS_KEY = 'results'
 DETAILS_KEY = 'details'
 SIMILARITY_KEY = 'similarity'
 
+MODES = ['updateTables', 'addNetworks', 'updateNetwork', 'updateLayouts', 'updateSelection',
+         'openURL', 'updatelayoutandselection', 'testprogress']
+
+MEMORY_BUDGET_EXIT_CODE = 3
+
+# input value denoting CX2 is read from standard in
+STDIN_INPUT = '-'
+
+# buffer size used when writing result to --output
+OUTPUT_BUFFER_SIZE = 4 * 1024 * 1024
+
+# rough in memory cost of the parsed JSON per byte of CX2 on disk
+# and of each node/edge once loaded into a CX2Network object
+JSON_BYTES_PER_FILE_BYTE = 6
+CX2NETWORK_BYTES_PER_NODE = 700
+CX2NETWORK_BYTES_PER_EDGE = 600
+
+# modes that only need node/edge ids and network attributes and
+# can therefore be run off a streamed, id only, view of the network
+ID_ONLY_MODES = ['updateTables', 'addNetworks', 'updateLayouts',
+                 'updateSelection', 'updatelayoutandselection']
+
+
+class MemoryBudgetExceededError(Exception):
+    """
+    Raised when a job would exceed, or has exceeded, the
+    memory budget set via --max_memory
+    """
+    pass
+
+
+def _positive_int(value):
+    """
+    Argument type for integers that must be 1 or more
+    """
+    try:
+        int_value = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(str(value) + ' is not an integer')
+    if int_value < 1:
+        raise argparse.ArgumentTypeError(str(value) + ' must be 1 or more')
+    return int_value
+
 
 def _parse_arguments(desc, args):
     """
@@ -26,10 +80,10 @@ def _parse_arguments(desc, args):
     parser = argparse.ArgumentParser(description=desc,
                                      formatter_class=help_fm)
     parser.add_argument('input',
-                        help='Input: network in CX2 format, node data or edge data.')
+                        help='Input: network in CX2 format, node data or edge data. '
+                             'If set to ' + STDIN_INPUT + ' input is read from standard in')
     parser.add_argument('--mode',
-                        choices=['updateTables', 'addNetworks', 'updateNetwork', 'updateLayouts', 'updateSelection',
-                                 'openURL', 'updatelayoutandselection', 'testprogress'],
+                        choices=MODES,
                         help='Mode denotes what result to return at an action level as well as a data level.'
                              'The special case here is updatelayoutandselection where two actions are put into'
                              'the output JSON',
@@ -40,6 +94,17 @@ def _parse_arguments(desc, args):
                         help='Column name. Default: test_col.')
     parser.add_argument('--column_value', default='test_val',
                         help='Value to put in --column_name column. Used by --mode updateTables')
+    parser.add_argument('--split_by', default='none',
+                        choices=['none', 'components', 'attribute'],
+                        help='Used by --mode addNetworks. If set to components, returns '
+                             'a network per connected component of input network. If set '
+                             'to attribute, returns a network induced by the nodes with '
+                             'each value of node attribute set via --column_name')
+    parser.add_argument('--num_workers', type=_positive_int, default=1,
+                        help='Number of worker processes used to build networks '
+                             'for --split_by. If 1, networks are built in this process. '
+                             'Ignored if --max_memory is set since memory of worker '
+                             'processes is not counted against the budget')
     parser.add_argument('--apply_to_edges', action='store_true',
                         help='Applies action on edges instead of nodes.')
     parser.add_argument('--sleep_time', type=int, default=0,
@@ -64,6 +129,15 @@ def _parse_arguments(desc, args):
                         help='Seed for random number generator')
     parser.add_argument('--openurl', default='https://ndexbio.org',
                         help='URL to open with openURL mode')
+    parser.add_argument('--max_memory', type=float,
+                        help='Memory budget in megabytes. If set, memory needed '
+                             'is estimated before parsing the input and a streaming '
+                             'id only parse is used when the full network would not '
+                             'fit. The job fails if peak memory exceeds this budget')
+    parser.add_argument('--output',
+                        help='If set, write result to this file instead of standard out. '
+                             'The result is written to a temporary file in the same '
+                             'directory that is renamed to this path once complete')
     parser.add_argument('--openurltarget', default='none',
                         help='If set to value other then empty string, whitespace, or "none", '
                              'open url in iframe on right side of Cytoscape Web')
@@ -80,6 +154,178 @@ def run_add_networks(net_cx2):
     return [new_net.to_cx2()]
 
 
+def get_connected_components(net_cx2):
+    """
+    Finds connected components of **net_cx2** using union-find
+    over the edges
+
+    :param net_cx2: network
+    :type net_cx2: :py:class:`~ndex2.cx2.CX2Network`
+    :raises NDExInvalidCX2Error: if an edge refers to a node that
+                                 is not in the network
+    :return: node ids for each component, in order of first
+             node seen
+    :rtype: list
+    """
+    parent = {node_id: node_id for node_id in net_cx2.get_nodes().keys()}
+
+    def find(node_id):
+        root = node_id
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[node_id] != root:
+            parent[node_id], node_id = root, parent[node_id]
+        return root
+
+    for edge_id, edge in net_cx2.get_edges().items():
+        for node_id in (edge['s'], edge['t']):
+            if node_id not in parent:
+                raise NDExInvalidCX2Error('Edge ' + str(edge_id) + ' refers to node ' +
+                                          str(node_id) + ' which is not in the network')
+        source_root = find(edge['s'])
+        target_root = find(edge['t'])
+        if source_root != target_root:
+            parent[target_root] = source_root
+
+    components = {}
+    for node_id in parent.keys():
+        components.setdefault(find(node_id), []).append(node_id)
+    return list(components.values())
+
+
+def get_node_attribute_groups(net_cx2, column_name):
+    """
+    Groups nodes of **net_cx2** by value of node attribute **column_name**.
+    Nodes without the attribute are not put in any group
+
+    :param net_cx2: network
+    :type net_cx2: :py:class:`~ndex2.cx2.CX2Network`
+    :param column_name: name of node attribute
+    :type column_name: str
+    :return: (value, node ids) tuples, in order of first node seen
+    :rtype: list
+    """
+    groups = {}
+    for node_id, node in net_cx2.get_nodes().items():
+        node_attrs = node.get('v')
+        if node_attrs is None or column_name not in node_attrs:
+            continue
+        value = node_attrs[column_name]
+        groups.setdefault(json.dumps(value, sort_keys=True), (value, []))[1].append(node_id)
+    return list(groups.values())
+
+
+def _build_subnetwork(task):
+    """
+    Builds a network in CX2 format from **task** which is a tuple of
+    (network name, attribute declarations, visual properties, nodes, edges).
+    Defined at module level so it can be run by a worker process
+    """
+    name, attribute_declarations, visual_properties, nodes, edges = task
+    new_net = CX2Network()
+    if attribute_declarations:
+        new_net.set_attribute_declarations(attribute_declarations)
+    new_net.add_network_attribute(key='name', value=name)
+    if visual_properties:
+        new_net.set_visual_properties(visual_properties)
+    for node in nodes:
+        new_net.add_node(node_id=node['id'], attributes=node.get('v'),
+                         x=node.get('x'), y=node.get('y'), z=node.get('z'))
+    for edge in edges:
+        new_net.add_edge(edge_id=edge['id'], source=edge['s'],
+                         target=edge['t'], attributes=edge.get('v'))
+    return new_net.to_cx2()
+
+
+def run_add_networks_split(net_cx2, split_by='components',
+                           column_name='test_col', num_workers=1):
+    """
+    Splits **net_cx2** into a network per connected component or, if
+    **split_by** is ``attribute``, a network induced by the nodes with
+    each value of node attribute **column_name**
+
+    Networks are generated one at a time and, if **num_workers** is
+    greater then 1, built by a pool of worker processes with at most
+    two networks per worker in flight so every network need not be
+    held in memory at once
+
+    :param net_cx2: network
+    :type net_cx2: :py:class:`~ndex2.cx2.CX2Network`
+    :param split_by: either ``components`` or ``attribute``
+    :type split_by: str
+    :param column_name: node attribute used if **split_by** is ``attribute``
+    :type column_name: str
+    :param num_workers: number of worker processes
+    :type num_workers: int
+    :return: generator of networks in CX2 format
+    """
+    net_name = net_cx2.get_network_attributes().get('name', '')
+    if split_by == 'attribute':
+        groups = [(column_name + '=' + str(value), node_ids) for value, node_ids
+                  in get_node_attribute_groups(net_cx2, column_name)]
+    else:
+        groups = [('component ' + str(index + 1), node_ids) for index, node_ids
+                  in enumerate(get_connected_components(net_cx2))]
+    sys.stderr.write('@@MESSAGE Splitting network into ' + str(len(groups)) + ' networks\n')
+
+    node_group = {}
+    for index, (_, node_ids) in enumerate(groups):
+        for node_id in node_ids:
+            node_group[node_id] = index
+
+    # only edge ids are kept per group, the edges themselves
+    # are looked up as each network is built
+    group_edge_ids = [[] for _ in groups]
+    for edge_id, edge in net_cx2.get_edges().items():
+        index = node_group.get(edge['s'])
+        if index is not None and index == node_group.get(edge['t']):
+            group_edge_ids[index].append(edge_id)
+
+    nodes = net_cx2.get_nodes()
+    edges = net_cx2.get_edges()
+    attribute_declarations = net_cx2.get_attribute_declarations()
+    visual_properties = net_cx2.get_visual_properties()
+
+    def get_tasks():
+        for index, (label, node_ids) in enumerate(groups):
+            yield ('New network from: ' + net_name + ' ' + label,
+                   attribute_declarations, visual_properties,
+                   [nodes[node_id] for node_id in node_ids],
+                   [edges[edge_id] for edge_id in group_edge_ids[index]])
+
+    if num_workers is None or num_workers <= 1:
+        for task in get_tasks():
+            yield _build_subnetwork(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        pending = deque()
+        for task in get_tasks():
+            pending.append(executor.submit(_build_subnetwork, task))
+            if len(pending) >= num_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _write_streamed_result(action, networks, out, memory_guard=None):
+    """
+    Writes result JSON for **action** to **out** writing each
+    network in **networks** as soon as it is generated. If
+    **memory_guard** is set, memory is checked after each network
+    """
+    out.write('[\n  {\n    "action": ' + json.dumps(action) + ',\n    "data": [')
+    separator = '\n'
+    for network in networks:
+        out.write(separator)
+        json.dump(network, out, indent=2)
+        separator = ',\n'
+        if memory_guard is not None:
+            memory_guard.check('building of networks')
+    out.write('\n    ]\n  }\n]')
+
+
 def run_update_network(net_cx2):
     net_cx2.add_node(attributes={"name": "new_node"})
     return net_cx2.to_cx2()
@@ -170,11 +416,379 @@ def run_testprogress(input, openurl=None, openurltarget=None,
 
 
 def get_cx2_net_from_input(input_path):
-    net_cx2_path = os.path.abspath(input_path)
     factory = RawCX2NetworkFactory()
+    if input_path == STDIN_INPUT:
+        return factory.get_cx2network(json.load(sys.stdin.buffer))
+    net_cx2_path = os.path.abspath(input_path)
     return factory.get_cx2network(net_cx2_path)
 
 
+@contextlib.contextmanager
+def open_input(input_path):
+    """
+    Opens **input_path** for buffered binary reading, or gives
+    standard in if **input_path** is :py:const:`STDIN_INPUT`
+
+    Files are deliberately not memory mapped, mapped pages count
+    toward peak resident set size which :py:class:`MemoryGuard`
+    measures and ijson copies through ``read()`` regardless
+
+    :param input_path: path to file or :py:const:`STDIN_INPUT`
+    :return: binary file like object
+    """
+    if input_path == STDIN_INPUT:
+        yield sys.stdin.buffer
+        return
+    with open(os.path.abspath(input_path), 'rb') as f:
+        yield f
+
+
+@contextlib.contextmanager
+def open_output(output_path):
+    """
+    Opens **output_path** for writing. Output goes through a
+    :py:const:`OUTPUT_BUFFER_SIZE` buffer to a temporary file in the
+    same directory that is renamed to **output_path** only if the
+    block completes, so readers never see a partial result
+
+    :param output_path: path to write to, if ``None`` standard out is used
+    :return: text file like object
+    """
+    if output_path is None:
+        yield sys.stdout
+        return
+    abs_path = os.path.abspath(output_path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(abs_path),
+                                    prefix='.' + os.path.basename(abs_path) + '.',
+                                    suffix='.tmp')
+    try:
+        # wrap fd right away so it is closed whatever fails below
+        try:
+            out = io.open(fd, 'w', buffering=OUTPUT_BUFFER_SIZE, encoding='utf-8')
+        except BaseException:
+            os.close(fd)
+            raise
+        with out:
+            # mkstemp creates the file readable only by owner,
+            # give it the permissions a regular open() would
+            umask = os.umask(0)
+            os.umask(umask)
+            os.fchmod(out.fileno(), 0o666 & ~umask)
+            yield out
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, abs_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class IdOnlyCX2Network(object):
+    """
+    Lightweight stand in for :py:class:`~ndex2.cx2.CX2Network` that
+    only holds node ids, edge ids and network attributes
+    """
+    def __init__(self, network_attributes=None, nodes=None, edges=None):
+        self._network_attributes = network_attributes if network_attributes is not None else {}
+        self._nodes = nodes if nodes is not None else {}
+        self._edges = edges if edges is not None else {}
+
+    def get_network_attributes(self):
+        return self._network_attributes
+
+    def get_nodes(self):
+        return self._nodes
+
+    def get_edges(self):
+        return self._edges
+
+
+def get_id_only_net_from_input(input_path):
+    """
+    Streams CX2 from **input_path** keeping only node ids,
+    edge ids and network attributes
+
+    :param input_path: path to CX2 file or :py:const:`STDIN_INPUT`
+    :return: id only view of network
+    :rtype: :py:class:`IdOnlyCX2Network`
+    """
+    net_cx2 = IdOnlyCX2Network()
+    with open_input(input_path) as f:
+        for prefix, event, value in ijson.parse(f):
+            if event == 'number' or event == 'string':
+                if prefix == 'item.nodes.item.id':
+                    net_cx2.get_nodes()[value] = {}
+                elif prefix == 'item.edges.item.id':
+                    net_cx2.get_edges()[value] = {}
+                elif prefix == 'item.networkAttributes.item.name':
+                    net_cx2.get_network_attributes()['name'] = value
+    return net_cx2
+
+
+def get_cx2_aspect_counts(input_path):
+    """
+    Gets element counts from the metaData aspect of CX2 without
+    parsing the rest of the file
+
+    :param input_path: path to CX2 file
+    :return: aspect name => element count, empty if there is no metaData
+    :rtype: dict
+    """
+    counts = {}
+    with open_input(input_path) as f:
+        for prefix, event, value in ijson.parse(f):
+            # metaData comes before the data aspects so stop at the first of those
+            if prefix == 'item' and event == 'map_key' and\
+                    value not in ('CXVersion', 'hasFragments', 'metaData'):
+                break
+            if prefix == 'item.metaData' and event == 'end_array':
+                break
+            if prefix == 'item.metaData.item' and event == 'start_map':
+                name = None
+                count = None
+            elif prefix == 'item.metaData.item.name':
+                name = value
+            elif prefix == 'item.metaData.item.elementCount':
+                count = int(value)
+            elif prefix == 'item.metaData.item' and event == 'end_map':
+                if name is not None and count is not None:
+                    counts[name] = count
+    return counts
+
+
+def estimate_cx2_memory(input_path):
+    """
+    Estimates bytes of memory needed to load **input_path** into
+    a :py:class:`~ndex2.cx2.CX2Network` using the file size and
+    the node and edge counts from the metaData aspect
+
+    :param input_path: path to CX2 file
+    :return: estimated bytes
+    :rtype: int
+    """
+    estimate = os.path.getsize(os.path.abspath(input_path)) * JSON_BYTES_PER_FILE_BYTE
+    counts = get_cx2_aspect_counts(input_path)
+    estimate += counts.get('nodes', 0) * CX2NETWORK_BYTES_PER_NODE
+    estimate += counts.get('edges', 0) * CX2NETWORK_BYTES_PER_EDGE
+    return estimate
+
+
+def maxrss_to_bytes(maxrss):
+    """
+    Converts ``ru_maxrss`` from :py:func:`resource.getrusage` or
+    :py:func:`os.wait4` to bytes. It is in bytes on macOS and in
+    kilobytes everywhere else
+
+    :param maxrss: ``ru_maxrss`` value
+    :type maxrss: int
+    :return: bytes
+    :rtype: int
+    """
+    if sys.platform == 'darwin':
+        return maxrss
+    return maxrss * 1024
+
+
+def get_peak_rss():
+    """
+    Gets peak resident set size of this process
+
+    :return: peak resident set size in bytes
+    :rtype: int
+    """
+    return maxrss_to_bytes(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+class MemoryGuard(object):
+    """
+    Watches peak resident set size of this process against a budget.
+    A background thread polls peak memory and, once the budget is
+    exceeded, interrupts the main thread which then raises
+    :py:class:`MemoryBudgetExceededError` instead of being killed by
+    the host
+
+    The interrupt is a SIGINT sent to the main thread. It wakes blocking
+    calls such as :py:func:`time.sleep` but the handler only runs
+    between Python bytecodes, so it cannot cut short a long running C
+    call such as :py:func:`json.load` or the C backend of ijson, the
+    job fails once that call returns.
+    The interrupt is only used if the guard is started from the main
+    thread, otherwise the budget is only enforced by :py:meth:`check`
+    """
+    def __init__(self, max_memory, poll_interval=0.25):
+        """
+        Constructor
+
+        :param max_memory: memory budget in bytes
+        :type max_memory: int
+        :param poll_interval: seconds between peak memory checks
+        :type poll_interval: float
+        """
+        self._max_memory = max_memory
+        self._poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._tripped = False
+        self._armed = False
+        self._interrupt_pending = False
+        self._sigint_handler_installed = False
+        self._previous_sigint_handler = None
+        self._main_thread_ident = None
+
+    def get_max_memory(self):
+        return self._max_memory
+
+    def fits(self, estimate):
+        """
+        Checks if **estimate** more bytes would fit in the budget
+        on top of what this process already uses
+
+        :rtype: bool
+        """
+        return get_peak_rss() + estimate <= self._max_memory
+
+    def check(self, stage):
+        """
+        Raises :py:class:`MemoryBudgetExceededError` if peak memory
+        exceeds the budget
+
+        :param stage: description of current stage of job used in error
+        :type stage: str
+        """
+        peak_rss = get_peak_rss()
+        if self._tripped or peak_rss > self._max_memory:
+            raise MemoryBudgetExceededError('Memory budget exceeded during ' +
+                                            str(stage) + ': peak ' +
+                                            _format_megabytes(peak_rss) +
+                                            ' exceeds --max_memory ' +
+                                            _format_megabytes(self._max_memory))
+
+    def start(self):
+        if threading.current_thread() is threading.main_thread():
+            self._previous_sigint_handler = signal.signal(signal.SIGINT,
+                                                          self._handle_sigint)
+            self._sigint_handler_installed = True
+            self._main_thread_ident = threading.main_thread().ident
+            self._armed = True
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops watching memory. Once this is called an interrupt
+        from the watch thread that has not yet been delivered is
+        ignored rather than raised. If an interrupt is delivered
+        before that, :py:class:`MemoryBudgetExceededError` is raised
+        but the previous SIGINT handler is still restored
+        """
+        try:
+            # plain assignment, the watch thread is joined below
+            # so it cannot send an interrupt once that returns
+            self._armed = False
+            self._stop_event.set()
+            if self._thread is not None:
+                self._thread.join()
+        finally:
+            # if an interrupt is still on its way, the handler
+            # restores the previous one after swallowing it
+            if not self._interrupt_pending:
+                self._restore_sigint_handler()
+
+    def _restore_sigint_handler(self):
+        if not self._sigint_handler_installed:
+            return
+        self._sigint_handler_installed = False
+        if self._previous_sigint_handler is not None:
+            signal.signal(signal.SIGINT, self._previous_sigint_handler)
+
+    def _handle_sigint(self, signum, frame):
+        if not self._interrupt_pending:
+            # a real SIGINT, not one sent by the watch thread,
+            # handle it as the previous handler would have
+            previous_handler = self._previous_sigint_handler
+            if previous_handler == signal.SIG_IGN:
+                return
+            if previous_handler == signal.SIG_DFL:
+                self._restore_sigint_handler()
+                os.kill(os.getpid(), signal.SIGINT)
+                return
+            if callable(previous_handler):
+                return previous_handler(signum, frame)
+            raise KeyboardInterrupt()
+        self._interrupt_pending = False
+        if self._armed:
+            self.check('run')
+        else:
+            self._restore_sigint_handler()
+
+    def _watch(self):
+        while not self._stop_event.wait(self._poll_interval):
+            if get_peak_rss() > self._max_memory:
+                self._tripped = True
+                if self._armed:
+                    self._interrupt_pending = True
+                    # a real signal, unlike _thread.interrupt_main(),
+                    # also wakes the main thread from blocking calls
+                    # such as time.sleep()
+                    signal.pthread_kill(self._main_thread_ident, signal.SIGINT)
+                return
+
+
+def _format_megabytes(num_bytes):
+    return str(round(float(num_bytes) / 1048576.0, 1)) + ' MB'
+
+
+def get_net_from_input(input_path, mode, memory_guard=None, allow_id_only=True):
+    """
+    Loads network from **input_path**. If **memory_guard** is set
+    and the full network is not estimated to fit in the budget, an
+    id only view of the network is streamed in for modes that allow it
+
+    If **input_path** is :py:const:`STDIN_INPUT` there is no up
+    front estimate, since standard in can only be read once, so the
+    id only fallback never applies and the full network is always
+    loaded. Only the peak memory checks of **memory_guard** apply
+
+    :param input_path: path to CX2 file or :py:const:`STDIN_INPUT`
+    :param mode: mode being run
+    :param memory_guard: memory budget to honor or ``None``
+    :type memory_guard: :py:class:`MemoryGuard`
+    :param allow_id_only: if ``False``, always require the full network
+    :type allow_id_only: bool
+    :raises MemoryBudgetExceededError: if network will not fit and
+                                       **mode** needs the full network
+    :return: network
+    """
+    if memory_guard is None:
+        return get_cx2_net_from_input(input_path)
+
+    if input_path == STDIN_INPUT:
+        # standard in can only be read once so there is no
+        # estimating up front, peak memory is still watched
+        sys.stderr.write('@@MESSAGE Input is standard in, skipping memory estimate\n')
+        net_cx2 = get_cx2_net_from_input(input_path)
+        memory_guard.check('loading of network')
+        return net_cx2
+
+    estimate = estimate_cx2_memory(input_path)
+    if memory_guard.fits(estimate):
+        net_cx2 = get_cx2_net_from_input(input_path)
+    elif allow_id_only and mode in ID_ONLY_MODES:
+        sys.stderr.write('@@MESSAGE Estimated ' + _format_megabytes(estimate) +
+                         ' needed to load network exceeds --max_memory ' +
+                         _format_megabytes(memory_guard.get_max_memory()) +
+                         ', streaming node and edge ids only\n')
+        net_cx2 = get_id_only_net_from_input(input_path)
+    else:
+        raise MemoryBudgetExceededError('Estimated ' + _format_megabytes(estimate) +
+                                        ' needed to load network for mode ' +
+                                        str(mode) + ' exceeds --max_memory ' +
+                                        _format_megabytes(memory_guard.get_max_memory()))
+    memory_guard.check('loading of network')
+    return net_cx2
+
+
 def main(args):
     """
     Main entry point for program
@@ -188,83 +802,126 @@ def main(args):
     """
 
     theargs = _parse_arguments(desc, args[1:])
+    memory_guard = None
+    if theargs.max_memory is not None:
+        memory_guard = MemoryGuard(int(theargs.max_memory * 1048576))
+        memory_guard.start()
     try:
-        theres = None
-
-        # sleep amount of time designated
-        sys.stderr.write('@@MESSAGE Sleeping ' + str(theargs.sleep_time) + ' seconds.\n')
-        sys.stderr.write('@@PROGRESS 10\n')
-        if theargs.mode != 'testprogress':
-            time.sleep(theargs.sleep_time)
-
-        sys.stderr.write('@@MESSAGE Setting random seed to: ' + str(theargs.random_seed) +'\n')
-        random.seed(theargs.random_seed)
-        if theargs.error_message is not None:
-            sys.stderr.write(theargs.error_message)
-            sys.stderr.flush()
-            return 1
-
-        if theargs.mode == 'updateTables':
-            net_cx2 = get_cx2_net_from_input(theargs.input)
-            aspect = "edge" if theargs.apply_to_edges else "node"
-            theres = run_update_tables(net_cx2=net_cx2, column_name=theargs.column_name,
-                                       column_value=theargs.column_value, aspect=aspect)
-        elif theargs.mode == 'addNetworks':
-            net_cx2 = get_cx2_net_from_input(theargs.input)
-            theres = run_add_networks(net_cx2)
-        elif theargs.mode == 'updateNetwork':
-            net_cx2 = get_cx2_net_from_input(theargs.input)
-            theres = run_update_network(net_cx2)
-        elif theargs.mode == 'updateLayouts':
-            net_cx2 = get_cx2_net_from_input(theargs.input)
-            theres = run_update_layouts(net_cx2,
-                                        min_x=theargs.min_x_layoutcoord,
-                                        max_x=theargs.max_x_layoutcoord,
-                                        min_y=theargs.min_y_layoutcoord,
-                                        max_y=theargs.max_y_layoutcoord,
-                                        min_z=theargs.min_z_layoutcoord,
-                                        max_z=theargs.max_z_layoutcoord,
-                                        include_z=theargs.include_zcoord)
-        elif theargs.mode == 'updateSelection':
-            net_cx2 = get_cx2_net_from_input(theargs.input)
-            theres = run_update_selection(net_cx2)
-        elif theargs.mode == 'openURL':
-            theres = run_openurl(theargs.input, openurl=theargs.openurl,
-                                 openurltarget=theargs.openurltarget)
-        elif theargs.mode == 'testprogress':
-            theargs.mode = 'openURL'
-            theres = run_testprogress(theargs.input, openurl=theargs.openurl,
-                                      openurltarget=theargs.openurltarget,
-                                      sleeptime=theargs.sleep_time)
-        elif theargs.mode == 'updatelayoutandselection':
-            net_cx2 = get_cx2_net_from_input(theargs.input)
-            theres = [{ 'action': 'updateLayouts',
-                        'data': run_update_layouts(net_cx2,
-                                                   min_x=theargs.min_x_layoutcoord,
-                                                   max_x=theargs.max_x_layoutcoord,
-                                                   min_y=theargs.min_y_layoutcoord,
-                                                   max_y=theargs.max_y_layoutcoord,
-                                                   min_z=theargs.min_z_layoutcoord,
-                                                   max_z=theargs.max_z_layoutcoord,
-                                                   include_z=theargs.include_zcoord)},
-                      { 'action': 'updateSelection',
-                        'data': run_update_selection(net_cx2)}]
-
-        if theres is None:
-            sys.stderr.write('No results\n')
-        else:
-            # special case if updatelayoutandselection just return the value
-            # since that call already adds in an action
-            if theargs.mode == 'updatelayoutandselection':
-                newres = theres
+        try:
+            theres = None
+
+            # sleep amount of time designated
+            sys.stderr.write('@@MESSAGE Sleeping ' + str(theargs.sleep_time) + ' seconds.\n')
+            sys.stderr.write('@@PROGRESS 10\n')
+            if theargs.mode != 'testprogress':
+                time.sleep(theargs.sleep_time)
+
+            sys.stderr.write('@@MESSAGE Setting random seed to: ' + str(theargs.random_seed) +'\n')
+            random.seed(theargs.random_seed)
+            if theargs.error_message is not None:
+                sys.stderr.write(theargs.error_message)
+                sys.stderr.flush()
+                return 1
+
+            if theargs.mode == 'updateTables':
+                net_cx2 = get_net_from_input(theargs.input, theargs.mode,
+                                             memory_guard=memory_guard)
+                aspect = "edge" if theargs.apply_to_edges else "node"
+                theres = run_update_tables(net_cx2=net_cx2, column_name=theargs.column_name,
+                                           column_value=theargs.column_value, aspect=aspect)
+            elif theargs.mode == 'addNetworks':
+                if theargs.split_by == 'none':
+                    net_cx2 = get_net_from_input(theargs.input, theargs.mode,
+                                                 memory_guard=memory_guard)
+                    theres = run_add_networks(net_cx2)
+                else:
+                    net_cx2 = get_net_from_input(theargs.input, theargs.mode,
+                                                 memory_guard=memory_guard,
+                                                 allow_id_only=False)
+                    num_workers = theargs.num_workers
+                    if memory_guard is not None and num_workers > 1:
+                        sys.stderr.write('@@MESSAGE --max_memory set, building networks '
+                                         'in this process instead of ' +
+                                         str(num_workers) + ' workers\n')
+                        num_workers = 1
+                    theres = run_add_networks_split(net_cx2, split_by=theargs.split_by,
+                                                    column_name=theargs.column_name,
+                                                    num_workers=num_workers)
+            elif theargs.mode == 'updateNetwork':
+                net_cx2 = get_net_from_input(theargs.input, theargs.mode,
+                                             memory_guard=memory_guard)
+                theres = run_update_network(net_cx2)
+            elif theargs.mode == 'updateLayouts':
+                net_cx2 = get_net_from_input(theargs.input, theargs.mode,
+                                             memory_guard=memory_guard)
+                theres = run_update_layouts(net_cx2,
+                                            min_x=theargs.min_x_layoutcoord,
+                                            max_x=theargs.max_x_layoutcoord,
+                                            min_y=theargs.min_y_layoutcoord,
+                                            max_y=theargs.max_y_layoutcoord,
+                                            min_z=theargs.min_z_layoutcoord,
+                                            max_z=theargs.max_z_layoutcoord,
+                                            include_z=theargs.include_zcoord)
+            elif theargs.mode == 'updateSelection':
+                net_cx2 = get_net_from_input(theargs.input, theargs.mode,
+                                             memory_guard=memory_guard)
+                theres = run_update_selection(net_cx2)
+            elif theargs.mode == 'openURL':
+                theres = run_openurl(theargs.input, openurl=theargs.openurl,
+                                     openurltarget=theargs.openurltarget)
+            elif theargs.mode == 'testprogress':
+                theargs.mode = 'openURL'
+                theres = run_testprogress(theargs.input, openurl=theargs.openurl,
+                                          openurltarget=theargs.openurltarget,
+                                          sleeptime=theargs.sleep_time)
+            elif theargs.mode == 'updatelayoutandselection':
+                net_cx2 = get_net_from_input(theargs.input, theargs.mode,
+                                             memory_guard=memory_guard)
+                theres = [{ 'action': 'updateLayouts',
+                            'data': run_update_layouts(net_cx2,
+                                                       min_x=theargs.min_x_layoutcoord,
+                                                       max_x=theargs.max_x_layoutcoord,
+                                                       min_y=theargs.min_y_layoutcoord,
+                                                       max_y=theargs.max_y_layoutcoord,
+                                                       min_z=theargs.min_z_layoutcoord,
+                                                       max_z=theargs.max_z_layoutcoord,
+                                                       include_z=theargs.include_zcoord)},
+                          { 'action': 'updateSelection',
+                            'data': run_update_selection(net_cx2)}]
+
+            # networks for --split_by are built lazily as they are
+            # written out and are checked by _write_streamed_result
+            if memory_guard is not None and not isinstance(theres, types.GeneratorType):
+                memory_guard.check('processing of network')
+
+            if theres is None:
+                sys.stderr.write('No results\n')
             else:
-                newres = [{'action': theargs.mode,
-                           'data': theres}]
-            json.dump(newres, sys.stdout, indent=2)
-        sys.stdout.flush()
-        sys.stderr.flush()
+                # special case if updatelayoutandselection just return the value
+                # since that call already adds in an action
+                with open_output(theargs.output) as out:
+                    if theargs.mode == 'updatelayoutandselection':
+                        json.dump(theres, out, indent=2)
+                    elif isinstance(theres, types.GeneratorType):
+                        _write_streamed_result(theargs.mode, theres, out,
+                                               memory_guard=memory_guard)
+                    else:
+                        newres = [{'action': theargs.mode,
+                                   'data': theres}]
+                        json.dump(newres, out, indent=2)
+            sys.stdout.flush()
+            sys.stderr.flush()
 
-        return 0
+            return 0
+        finally:
+            # stop before handling any error so a late interrupt from
+            # the watch thread cannot escape the handlers below
+            if memory_guard is not None:
+                memory_guard.stop()
+    except MemoryBudgetExceededError as e:
+        sys.stderr.write('Caught exception: ' + str(e))
+        sys.stderr.flush()
+        return MEMORY_BUDGET_EXIT_CODE
     except Exception as e:
         sys.stderr.write('Caught exception: ' + str(e))
         sys.stderr.flush()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `loadtest` module."""
+
+import sys
+import random
+import signal
+import unittest
+from unittest.mock import patch
+
+from ndex2.cx2 import CX2Network
+
+from testcywebserviceapp import loadtest
+from testcywebserviceapp import testcywebserviceappcmd
+
+
+class TestLoadtest(unittest.TestCase):
+
+    def test_modes_match_app(self):
+        self.assertTrue(loadtest.MODES is testcywebserviceappcmd.MODES)
+
+    def test_parse_status_line(self):
+        self.assertEqual(('message', 'Sleeping 0 seconds.'),
+                         loadtest.parse_status_line('@@MESSAGE Sleeping 0 seconds.\n'))
+        self.assertEqual(('progress', 10),
+                         loadtest.parse_status_line('@@PROGRESS 10\n'))
+        self.assertIsNone(loadtest.parse_status_line('@@PROGRESS ten\n'))
+        self.assertIsNone(loadtest.parse_status_line('Caught exception: boom'))
+        self.assertIsNone(loadtest.parse_status_line(''))
+
+    def test_get_percentile(self):
+        self.assertIsNone(loadtest.get_percentile([], 50))
+        values = list(range(100, 0, -1))
+        self.assertEqual(50, loadtest.get_percentile(values, 50))
+        self.assertEqual(95, loadtest.get_percentile(values, 95))
+        self.assertEqual(99, loadtest.get_percentile(values, 99))
+        self.assertEqual(1, loadtest.get_percentile(values, 0))
+        self.assertEqual(100, loadtest.get_percentile(values, 100))
+        self.assertEqual(7, loadtest.get_percentile([7], 99))
+        self.assertEqual(2, loadtest.get_percentile([1, 2, 3], 50))
+
+    def test_maxrss_to_bytes(self):
+        with patch.object(sys, 'platform', 'linux'):
+            self.assertEqual(2048, testcywebserviceappcmd.maxrss_to_bytes(2))
+        with patch.object(sys, 'platform', 'darwin'):
+            self.assertEqual(2, testcywebserviceappcmd.maxrss_to_bytes(2))
+
+    def _get_stats(self, mode, latency, first_progress=None, peak_rss=1048576,
+                   returncode=0, valid_result=True):
+        return {'mode': mode, 'latency': latency, 'first_progress': first_progress,
+                'peak_rss': peak_rss, 'returncode': returncode,
+                'valid_result': valid_result, 'messages': [], 'progress': []}
+
+    def test_summarize(self):
+        job_stats = [self._get_stats('updateTables', 1.0, first_progress=0.1),
+                     self._get_stats('updateTables', 2.0, first_progress=0.2,
+                                     peak_rss=3 * 1048576),
+                     self._get_stats('openURL', 3.0, returncode=2),
+                     self._get_stats('openURL', 4.0, first_progress=0.4,
+                                     valid_result=False)]
+        report = loadtest.summarize(job_stats, 2.0)
+        self.assertEqual(4, report['jobs'])
+        self.assertEqual(2, report['failed'])
+        self.assertEqual(2.0, report['wall_time'])
+        self.assertEqual(2.0, report['throughput_jobs_per_sec'])
+        self.assertEqual(2.0, report['latency_p50'])
+        self.assertEqual(4.0, report['latency_p95'])
+        self.assertEqual(4.0, report['latency_p99'])
+        # jobs without progress are left out of time to first progress
+        self.assertEqual(0.2, report['first_progress_p50'])
+        self.assertEqual(0.4, report['first_progress_p95'])
+        self.assertEqual(3.0, report['peak_rss_max_mb'])
+
+        self.assertEqual(['openURL', 'updateTables'], sorted(report['modes'].keys()))
+        tables = report['modes']['updateTables']
+        self.assertEqual(2, tables['jobs'])
+        self.assertEqual(0, tables['failed'])
+        self.assertEqual(1.0, tables['latency_p50'])
+        self.assertEqual(3.0, tables['peak_rss_max_mb'])
+        openurl = report['modes']['openURL']
+        self.assertEqual(2, openurl['failed'])
+        self.assertEqual(0.4, openurl['first_progress_p50'])
+
+    def test_summarize_zero_wall_time(self):
+        report = loadtest.summarize([self._get_stats('openURL', 0.0)], 0)
+        self.assertEqual(1, report['jobs'])
+        self.assertIsNone(report['throughput_jobs_per_sec'])
+        self.assertIsNone(report['first_progress_p50'])
+
+    def test_summarize_no_jobs(self):
+        report = loadtest.summarize([], 1.0)
+        self.assertEqual(0, report['jobs'])
+        self.assertEqual(0, report['failed'])
+        self.assertEqual(0.0, report['throughput_jobs_per_sec'])
+        self.assertIsNone(report['latency_p50'])
+        self.assertIsNone(report['first_progress_p95'])
+        self.assertIsNone(report['peak_rss_max_mb'])
+        self.assertEqual({}, report['modes'])
+
+    def test_run_job_exit_code(self):
+        stats = loadtest.run_job([sys.executable, '-c',
+                                  'import sys\n'
+                                  'sys.stderr.write("@@MESSAGE hi\\n@@PROGRESS 50\\n")\n'
+                                  'print("[]")\n'
+                                  'sys.exit(3)'])
+        self.assertEqual(3, stats['returncode'])
+        self.assertEqual(['hi'], stats['messages'])
+        self.assertEqual([50], stats['progress'])
+        self.assertTrue(stats['valid_result'])
+        self.assertIsNotNone(stats['first_progress'])
+        self.assertTrue(stats['peak_rss'] > 0)
+
+    def test_run_job_killed_by_signal(self):
+        stats = loadtest.run_job([sys.executable, '-c',
+                                  'import os, signal\n'
+                                  'os.kill(os.getpid(), signal.SIGTERM)'])
+        self.assertEqual(-signal.SIGTERM, stats['returncode'])
+        self.assertFalse(stats['valid_result'])
+
+    def test_generate_synthetic_cx2(self):
+        cx2 = loadtest.generate_synthetic_cx2(10, 15, rand=random.Random(1))
+        net_cx2 = CX2Network()
+        net_cx2.create_from_raw_cx2(cx2)
+        self.assertEqual(10, len(net_cx2.get_nodes()))
+        self.assertEqual(15, len(net_cx2.get_edges()))
+        counts = {m['name']: m['elementCount'] for m in cx2[1]['metaData']}
+        self.assertEqual(10, counts['nodes'])
+        self.assertEqual(15, counts['edges'])
+
+
+if __name__ == '__main__':
+    unittest.main()
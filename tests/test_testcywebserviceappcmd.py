@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `testcywebserviceappcmd` script."""
+
+import io
+import os
+import sys
+import json
+import time
+import signal
+import _thread
+import subprocess
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from concurrent.futures import Future
+
+from ndex2.cx2 import CX2Network
+from ndex2.exceptions import NDExInvalidCX2Error
+
+from testcywebserviceapp import testcywebserviceappcmd
+
+
+def _get_cx2(nodes, edges, name='test', include_metadata=True):
+    cx2 = [{'CXVersion': '2.0', 'hasFragments': False}]
+    if include_metadata:
+        cx2.append({'metaData': [{'name': 'networkAttributes', 'elementCount': 1},
+                                 {'name': 'nodes', 'elementCount': len(nodes)},
+                                 {'name': 'edges', 'elementCount': len(edges)}]})
+    cx2.extend([{'networkAttributes': [{'name': name}]},
+                {'nodes': nodes},
+                {'edges': edges},
+                {'status': [{'error': '', 'success': True}]}])
+    return cx2
+
+
+class TestTestcywebserviceappcmd(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._nodes = [{'id': 0, 'v': {'name': 'a'}},
+                       {'id': 1, 'v': {'name': 'b'}},
+                       {'id': 2, 'v': {'name': 'c'}}]
+        self._edges = [{'id': 10, 's': 0, 't': 1, 'v': {}}]
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _write_cx2(self, cx2, filename='net.cx2'):
+        path = os.path.join(self._tmpdir, filename)
+        with open(path, 'w') as f:
+            json.dump(cx2, f)
+        return path
+
+    def test_get_cx2_aspect_counts(self):
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges))
+        self.assertEqual({'networkAttributes': 1, 'nodes': 3, 'edges': 1},
+                         testcywebserviceappcmd.get_cx2_aspect_counts(path))
+
+    def test_get_cx2_aspect_counts_no_metadata(self):
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges,
+                                        include_metadata=False))
+        self.assertEqual({}, testcywebserviceappcmd.get_cx2_aspect_counts(path))
+
+    def test_estimate_cx2_memory(self):
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges))
+        expected = os.path.getsize(path) * testcywebserviceappcmd.JSON_BYTES_PER_FILE_BYTE +\
+            3 * testcywebserviceappcmd.CX2NETWORK_BYTES_PER_NODE +\
+            1 * testcywebserviceappcmd.CX2NETWORK_BYTES_PER_EDGE
+        self.assertEqual(expected, testcywebserviceappcmd.estimate_cx2_memory(path))
+
+    def test_get_net_from_input_without_guard(self):
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges))
+        net_cx2 = testcywebserviceappcmd.get_net_from_input(path, 'updateNetwork')
+        self.assertTrue(isinstance(net_cx2, CX2Network))
+        self.assertEqual(3, len(net_cx2.get_nodes()))
+
+    def test_get_net_from_input_fits(self):
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges))
+        memory_guard = MagicMock()
+        memory_guard.fits.return_value = True
+        net_cx2 = testcywebserviceappcmd.get_net_from_input(path, 'updateTables',
+                                                            memory_guard=memory_guard)
+        self.assertTrue(isinstance(net_cx2, CX2Network))
+        memory_guard.check.assert_called_once_with('loading of network')
+
+    def test_get_net_from_input_falls_back_to_id_only(self):
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges, name='big'))
+        memory_guard = MagicMock()
+        memory_guard.fits.return_value = False
+        memory_guard.get_max_memory.return_value = 1
+        net_cx2 = testcywebserviceappcmd.get_net_from_input(path, 'updateTables',
+                                                            memory_guard=memory_guard)
+        self.assertTrue(isinstance(net_cx2, testcywebserviceappcmd.IdOnlyCX2Network))
+        self.assertEqual([0, 1, 2], list(net_cx2.get_nodes().keys()))
+        self.assertEqual([10], list(net_cx2.get_edges().keys()))
+        self.assertEqual('big', net_cx2.get_network_attributes()['name'])
+
+    def test_get_net_from_input_id_only_not_allowed(self):
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges))
+        memory_guard = MagicMock()
+        memory_guard.fits.return_value = False
+        memory_guard.get_max_memory.return_value = 1
+        for mode, allow_id_only in [('updateNetwork', True),
+                                    ('addNetworks', False)]:
+            with self.assertRaises(testcywebserviceappcmd.MemoryBudgetExceededError):
+                testcywebserviceappcmd.get_net_from_input(path, mode,
+                                                          memory_guard=memory_guard,
+                                                          allow_id_only=allow_id_only)
+
+    def test_memory_guard_check(self):
+        testcywebserviceappcmd.MemoryGuard(2 ** 62).check('test')
+        with self.assertRaises(testcywebserviceappcmd.MemoryBudgetExceededError):
+            testcywebserviceappcmd.MemoryGuard(1).check('test')
+
+    def test_main_memory_budget_exceeded(self):
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges))
+        self.assertEqual(testcywebserviceappcmd.MEMORY_BUDGET_EXIT_CODE,
+                         testcywebserviceappcmd.main(['prog', path,
+                                                      '--mode', 'updateNetwork',
+                                                      '--max_memory', '1']))
+
+    def test_main_memory_budget_exceeded_during_run(self):
+        # watch thread trips while main() sleeps, before anything is loaded
+        path = self._write_cx2(_get_cx2(self._nodes, self._edges))
+        original_handler = signal.getsignal(signal.SIGINT)
+        self.assertEqual(testcywebserviceappcmd.MEMORY_BUDGET_EXIT_CODE,
+                         testcywebserviceappcmd.main(['prog', path,
+                                                      '--sleep_time', '5',
+                                                      '--max_memory', '1']))
+        self.assertTrue(signal.getsignal(signal.SIGINT) is original_handler)
+
+    def test_memory_guard_interrupts_main_thread(self):
+        original_handler = signal.getsignal(signal.SIGINT)
+        memory_guard = testcywebserviceappcmd.MemoryGuard(1, poll_interval=0.05)
+        memory_guard.start()
+        try:
+            with self.assertRaises(testcywebserviceappcmd.MemoryBudgetExceededError):
+                time.sleep(5)
+        finally:
+            memory_guard.stop()
+        self.assertTrue(signal.getsignal(signal.SIGINT) is original_handler)
+
+    def test_memory_guard_restores_sigint_handler_when_not_tripped(self):
+        original_handler = signal.getsignal(signal.SIGINT)
+        memory_guard = testcywebserviceappcmd.MemoryGuard(2 ** 62, poll_interval=0.05)
+        memory_guard.start()
+        self.assertFalse(signal.getsignal(signal.SIGINT) is original_handler)
+        time.sleep(0.1)
+        memory_guard.stop()
+        self.assertTrue(signal.getsignal(signal.SIGINT) is original_handler)
+
+    def test_memory_guard_stop_with_interrupt_pending(self):
+        # interrupt sent by watch thread that arrives after stop()
+        # is swallowed and the original handler put back
+        original_handler = signal.getsignal(signal.SIGINT)
+        memory_guard = testcywebserviceappcmd.MemoryGuard(2 ** 62)
+        memory_guard.start()
+        memory_guard._interrupt_pending = True
+        memory_guard.stop()
+        self.assertFalse(signal.getsignal(signal.SIGINT) is original_handler)
+        _thread.interrupt_main()
+        time.sleep(0.05)
+        self.assertTrue(signal.getsignal(signal.SIGINT) is original_handler)
+
+    def test_memory_guard_keeps_ignored_sigint_ignored(self):
+        original_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            memory_guard = testcywebserviceappcmd.MemoryGuard(2 ** 62)
+            memory_guard.start()
+            os.kill(os.getpid(), signal.SIGINT)
+            time.sleep(0.05)
+            memory_guard.stop()
+            self.assertEqual(signal.SIG_IGN, signal.getsignal(signal.SIGINT))
+        finally:
+            signal.signal(signal.SIGINT, original_handler)
+
+    def test_memory_guard_default_sigint_still_kills(self):
+        script = ('import os, signal, time\n'
+                  'from testcywebserviceapp import testcywebserviceappcmd\n'
+                  'signal.signal(signal.SIGINT, signal.SIG_DFL)\n'
+                  'testcywebserviceappcmd.MemoryGuard(2 ** 62).start()\n'
+                  'os.kill(os.getpid(), signal.SIGINT)\n'
+                  'time.sleep(5)\n')
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(-signal.SIGINT,
+                         subprocess.call([sys.executable, '-c', script], env=env))
+
+    def _get_split_net(self):
+        # 0-1-2 connected, 3 isolated, 4-5 connected, 6 has no group attribute
+        nodes = [{'id': node_id, 'v': {'name': str(node_id), 'group': group}}
+                 for node_id, group in [(0, 'x'), (1, 'x'), (2, 'y'),
+                                        (3, 'y'), (4, 'x'), (5, 'x')]]
+        nodes.append({'id': 6, 'v': {'name': '6'}})
+        edges = [{'id': 10, 's': 0, 't': 1, 'v': {}},
+                 {'id': 11, 's': 2, 't': 1, 'v': {}},
+                 {'id': 12, 's': 4, 't': 5, 'v': {}},
+                 {'id': 13, 's': 5, 't': 2, 'v': {}}]
+        net_cx2 = CX2Network()
+        net_cx2.create_from_raw_cx2(_get_cx2(nodes, edges, name='split'))
+        return net_cx2
+
+    def test_get_connected_components(self):
+        components = testcywebserviceappcmd.get_connected_components(self._get_split_net())
+        self.assertEqual([[0, 1, 2, 4, 5], [3], [6]],
+                         sorted(sorted(c) for c in components))
+
+    def test_get_connected_components_edge_to_missing_node(self):
+        net_cx2 = CX2Network()
+        net_cx2.add_node(node_id=0)
+        net_cx2.add_edge(edge_id=5, source=0, target=7)
+        with self.assertRaisesRegex(NDExInvalidCX2Error, 'Edge 5 refers to node 7'):
+            testcywebserviceappcmd.get_connected_components(net_cx2)
+
+    def test_get_node_attribute_groups(self):
+        groups = testcywebserviceappcmd.get_node_attribute_groups(self._get_split_net(),
+                                                                  'group')
+        self.assertEqual([('x', [0, 1, 4, 5]), ('y', [2, 3])], groups)
+        self.assertEqual([], testcywebserviceappcmd.get_node_attribute_groups(self._get_split_net(),
+                                                                              'missing'))
+
+    def test_run_add_networks_split_by_attribute(self):
+        networks = list(testcywebserviceappcmd.run_add_networks_split(self._get_split_net(),
+                                                                      split_by='attribute',
+                                                                      column_name='group'))
+        self.assertEqual(2, len(networks))
+        x_net = CX2Network()
+        x_net.create_from_raw_cx2(networks[0])
+        self.assertEqual('New network from: split group=x',
+                         x_net.get_network_attributes()['name'])
+        self.assertEqual([0, 1, 4, 5], sorted(x_net.get_nodes().keys()))
+        # edges crossing groups are dropped
+        self.assertEqual([10, 12], sorted(x_net.get_edges().keys()))
+
+    def _get_many_components_net(self, num_components=200):
+        # component i is nodes 2i and 2i+1 joined by an edge
+        nodes = [{'id': node_id, 'v': {'name': str(node_id)}}
+                 for node_id in range(num_components * 2)]
+        edges = [{'id': 1000000 + i, 's': 2 * i, 't': 2 * i + 1, 'v': {}}
+                 for i in range(num_components)]
+        return _get_cx2(nodes, edges, name='many')
+
+    def test_run_add_networks_split_worker_pool_matches_in_process(self):
+        net_cx2 = CX2Network()
+        net_cx2.create_from_raw_cx2(self._get_many_components_net())
+        in_process = list(testcywebserviceappcmd.run_add_networks_split(net_cx2,
+                                                                        num_workers=1))
+        pooled = list(testcywebserviceappcmd.run_add_networks_split(net_cx2,
+                                                                    num_workers=2))
+        self.assertEqual(200, len(in_process))
+        self.assertEqual(in_process, pooled)
+
+    def test_run_add_networks_split_bounds_networks_in_flight(self):
+        submitted = []
+
+        class FakeExecutor(object):
+            def __init__(self, max_workers=None):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def submit(self, func, task):
+                submitted.append(task)
+                future = Future()
+                future.set_result(func(task))
+                return future
+
+        net_cx2 = CX2Network()
+        net_cx2.create_from_raw_cx2(self._get_many_components_net(num_components=20))
+        with patch.object(testcywebserviceappcmd, 'ProcessPoolExecutor', FakeExecutor):
+            networks = testcywebserviceappcmd.run_add_networks_split(net_cx2, num_workers=3)
+            names = []
+            for network in networks:
+                names.append([a for a in network if 'networkAttributes' in a]
+                             [0]['networkAttributes'][0]['name'])
+                # at most num_workers * 2 submitted but not yet yielded
+                self.assertTrue(len(submitted) - len(names) <= 5)
+        self.assertEqual(['New network from: many component ' + str(i + 1)
+                          for i in range(20)], names)
+
+    def test_main_split_by_components(self):
+        path = self._write_cx2(self._get_many_components_net(num_components=50))
+        outputs = []
+        for num_workers in ['1', '4']:
+            with patch('sys.stdout', new_callable=io.StringIO) as out:
+                self.assertEqual(0, testcywebserviceappcmd.main(['prog', path,
+                                                                 '--mode', 'addNetworks',
+                                                                 '--split_by', 'components',
+                                                                 '--num_workers', num_workers]))
+                outputs.append(out.getvalue())
+        self.assertEqual(outputs[0], outputs[1])
+        res = json.loads(outputs[0])
+        self.assertEqual('addNetworks', res[0]['action'])
+        self.assertEqual(50, len(res[0]['data']))
+        for network in res[0]['data']:
+            nodes = [a for a in network if 'nodes' in a][0]['nodes']
+            self.assertEqual(2, len(nodes))
+
+    def test_num_workers_must_be_positive(self):
+        for value in ['0', '-1', 'two']:
+            with patch('sys.stderr', new_callable=io.StringIO):
+                with self.assertRaises(SystemExit):
+                    testcywebserviceappcmd._parse_arguments('desc', ['x', '--num_workers', value])
+        self.assertEqual(2, testcywebserviceappcmd._parse_arguments('desc', ['x', '--num_workers',
+                                                                             '2']).num_workers)
+
+    def test_write_streamed_result_checks_memory_per_network(self):
+        memory_guard = MagicMock()
+        memory_guard.check.side_effect = [None,
+                                          testcywebserviceappcmd.MemoryBudgetExceededError('over')]
+        out = io.StringIO()
+        with self.assertRaises(testcywebserviceappcmd.MemoryBudgetExceededError):
+            testcywebserviceappcmd._write_streamed_result('addNetworks', iter([[1], [2], [3]]),
+                                                          out, memory_guard=memory_guard)
+        self.assertEqual(2, memory_guard.check.call_count)
+
+        out = io.StringIO()
+        testcywebserviceappcmd._write_streamed_result('addNetworks', iter([[1], [2]]), out)
+        self.assertEqual([{'action': 'addNetworks', 'data': [[1], [2]]}],
+                         json.loads(out.getvalue()))
+
+    def test_open_output_renames_on_success(self):
+        path = os.path.join(self._tmpdir, 'result.json')
+        with testcywebserviceappcmd.open_output(path) as out:
+            out.write('[]')
+            # nothing at final path until block completes
+            self.assertFalse(os.path.exists(path))
+        with open(path, 'r') as f:
+            self.assertEqual('[]', f.read())
+        self.assertEqual(['result.json'], os.listdir(self._tmpdir))
+
+    def test_open_output_removes_temp_file_on_error(self):
+        path = os.path.join(self._tmpdir, 'result.json')
+        with self.assertRaises(ValueError):
+            with testcywebserviceappcmd.open_output(path) as out:
+                out.write('[')
+                raise ValueError('fail')
+        self.assertEqual([], os.listdir(self._tmpdir))
+
+    def test_open_output_closes_fd_if_chmod_fails(self):
+        path = os.path.join(self._tmpdir, 'result.json')
+        fds = []
+        real_mkstemp = tempfile.mkstemp
+
+        def mkstemp(*args, **kwargs):
+            fd, tmp_path = real_mkstemp(*args, **kwargs)
+            fds.append(fd)
+            return fd, tmp_path
+
+        with patch('tempfile.mkstemp', side_effect=mkstemp),\
+                patch('os.fchmod', side_effect=OSError('fail')):
+            with self.assertRaises(OSError):
+                with testcywebserviceappcmd.open_output(path):
+                    self.fail('should not get here')
+        self.assertEqual(1, len(fds))
+        with self.assertRaises(OSError):
+            os.fstat(fds[0])
+        self.assertEqual([], os.listdir(self._tmpdir))
+
+    def test_open_output_permissions(self):
+        path = os.path.join(self._tmpdir, 'result.json')
+        with testcywebserviceappcmd.open_output(path) as out:
+            out.write('[]')
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(0o666 & ~umask, os.stat(path).st_mode & 0o777)
+
+    def test_open_output_none_is_stdout(self):
+        with testcywebserviceappcmd.open_output(None) as out:
+            self.assertTrue(out is sys.stdout)
+
+    def test_get_net_from_stdin(self):
+        raw = json.dumps(_get_cx2(self._nodes, self._edges)).encode('utf-8')
+        for load_func in [testcywebserviceappcmd.get_cx2_net_from_input,
+                          testcywebserviceappcmd.get_id_only_net_from_input]:
+            with patch('sys.stdin', io.TextIOWrapper(io.BytesIO(raw))):
+                net_cx2 = load_func(testcywebserviceappcmd.STDIN_INPUT)
+            self.assertEqual([0, 1, 2], sorted(net_cx2.get_nodes().keys()))
+            self.assertEqual([10], list(net_cx2.get_edges().keys()))
+
+    def test_main_stdin_to_output(self):
+        raw = json.dumps(_get_cx2(self._nodes, self._edges)).encode('utf-8')
+        path = os.path.join(self._tmpdir, 'result.json')
+        with patch('sys.stdin', io.TextIOWrapper(io.BytesIO(raw))):
+            self.assertEqual(0, testcywebserviceappcmd.main(['prog', '-',
+                                                             '--mode', 'updateTables',
+                                                             '--output', path]))
+        with open(path, 'r') as f:
+            res = json.load(f)
+        self.assertEqual('updateTables', res[0]['action'])
+        self.assertEqual(3, len(res[0]['data']['rows']))
+
+
+if __name__ == '__main__':
+    unittest.main()